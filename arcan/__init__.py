@@ -83,7 +83,8 @@ async def chat_agent(
     query: str,
     # token: HTTPAuthorizationCredentials = Depends(auth_scheme),
 ):
-    from arcan.ai.agents import ArcanConversationAgent, agent_chat
+    from arcan.ai.agents import ArcanConversationAgent
+    from arcan.ai.interface.streaming import agent_chat
 
     agent = ArcanConversationAgent().agent
     return await agent_chat(query, agent)
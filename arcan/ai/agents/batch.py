@@ -0,0 +1,75 @@
+# %%
+import asyncio
+
+
+class BatchProcessor:
+    """Coalesces concurrent requests into gathered batches.
+
+    Requests submitted within ``window_ms`` of each other are pulled off an
+    internal queue and dispatched together via ``asyncio.gather``, bounded by
+    a semaphore, so N in-flight LLM calls overlap their network I/O instead
+    of serializing. Each caller awaits its own future and gets back exactly
+    the result (or exception) for its payload.
+
+    Attributes:
+        runner: Async callable invoked per payload (e.g. ``llm.ainvoke``).
+        batch_size (int): Maximum payloads dispatched per batch.
+        window_ms (int): How long to wait for more payloads before dispatching.
+        max_concurrency (int): Bound on concurrently running batches.
+    """
+
+    def __init__(
+        self, runner, batch_size: int = 8, window_ms: int = 50, max_concurrency: int = 8
+    ):
+        self.runner = runner
+        self.batch_size = batch_size
+        self.window = window_ms / 1000
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.queue = asyncio.Queue()
+        self._worker = None
+
+    async def submit(self, payload):
+        """Queue a payload and await its result from the batch worker."""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((payload, future))
+        return await future
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            async with self.semaphore:
+                results = await asyncio.gather(
+                    *(self.runner(payload) for payload, _ in batch),
+                    return_exceptions=True,
+                )
+            for (_, future), result in zip(batch, results):
+                if future.cancelled():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+# %%
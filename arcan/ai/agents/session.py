@@ -3,77 +3,339 @@
 import ast
 import os
 import pickle
-import weakref
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
 from typing import Any, Dict
 
+import orjson
+from sqlalchemy import bindparam, func, select
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session, joinedload
 
 from arcan.datamodel.chat_history import ChatHistory
 from arcan.datamodel.conversation import Conversation
 from arcan.datamodel.engine import SessionLocal
+from arcan.settings import get_settings
+
+try:
+    from redis import Redis
+except ImportError:  # pragma: no cover - redis is an optional cache backend
+    Redis = None
+
+# Chat history barely changes between consecutive requests from the same user,
+# so a short TTL keeps the hot read path off the database entirely.
+CHAT_HISTORY_CACHE_TTL = int(os.environ.get("ARCAN_CHAT_HISTORY_CACHE_TTL", 30))
+# Entries older than the freshness TTL but younger than the stale TTL are
+# served as a last-known-good fallback when the database is slow or down.
+CHAT_HISTORY_CACHE_STALE_TTL = int(
+    os.environ.get("ARCAN_CHAT_HISTORY_CACHE_STALE_TTL", 3600)
+)
+
+# Built once per process so every lookup reuses the same compiled statement
+# instead of reconstructing and recompiling the select per call.
+_CHAT_HISTORY_STMT = (
+    select(ChatHistory.history)
+    .where(ChatHistory.sender == bindparam("sender"))
+    .order_by(ChatHistory.updated_at.desc())
+    .limit(1)
+)
+
+# Only the most recent turns feed the agent's context window, so the rebuild
+# fetches newest-first with a hard cap instead of a user's entire table.
+CONVERSATION_HISTORY_MAX_TURNS = int(
+    os.environ.get("ARCAN_CONVERSATION_HISTORY_MAX_TURNS", 128)
+)
+
+# History is reconstructed from append-only conversation rows, so writing a
+# turn never re-uploads the whole history blob (which grew O(N^2) bytes over
+# a session as every upsert re-sent all prior turns).
+_CONVERSATION_HISTORY_STMT = (
+    select(Conversation.message, Conversation.response)
+    .where(Conversation.sender == bindparam("sender"))
+    .order_by(Conversation.created_at.desc())
+    .limit(CONVERSATION_HISTORY_MAX_TURNS)
+)
+
+
+def _serialize_history(agent_history) -> bytes:
+    """Serialize history to compact JSON bytes via orjson.
+
+    The old path pickled the history, stringified the bytes literal and later
+    reversed that with ast.literal_eval + pickle.loads — double the bytes
+    stored and real CPU per turn. Returning orjson's buffer directly (Redis
+    takes bytes) avoids a decode+encode round-trip per turn, which matters
+    on megabyte-sized long-session histories. Message objects collapse to
+    the same (role, text) pairs the agents keep in memory.
+    """
+    entries = []
+    for message in agent_history:
+        if isinstance(message, (list, tuple)):
+            entries.append(list(message))
+        else:
+            entries.append(
+                [getattr(message, "type", "ai"), getattr(message, "content", "")]
+            )
+    return orjson.dumps(entries)
+
+
+def _deserialize_history(raw) -> list:
+    return [tuple(entry) for entry in orjson.loads(raw)]
+
+
+class _AgentTTLCache:
+    """Bounded LRU with per-entry TTL for built agents.
+
+    The previous WeakValueDictionary dropped agents the moment the request's
+    strong reference died, so every request rebuilt the agent (and re-read
+    chat history). Strong references with LRU + TTL eviction keep hot users'
+    agents warm while bounding memory for cold ones.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: int = 1800):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        now = time.monotonic()
+        with self._lock:
+            # Drop expired entries opportunistically, then the coldest.
+            for stale_key in [k for k, (_, exp) in self._entries.items() if exp < now]:
+                del self._entries[stale_key]
+            while len(self._entries) >= self.maxsize:
+                self._entries.popitem(last=False)
+            self._entries[key] = (value, now + self.ttl)
+
+
+# Shared across ArcanSession instances — sessions are created per agent, so a
+# per-instance cache would never see a second request.
+AGENT_CACHE_MAX_AGENTS = int(os.environ.get("ARCAN_AGENT_CACHE_MAX_AGENTS", 1024))
+AGENT_CACHE_TTL = int(os.environ.get("ARCAN_AGENT_CACHE_TTL", 1800))
+_AGENT_CACHE = _AgentTTLCache(maxsize=AGENT_CACHE_MAX_AGENTS, ttl=AGENT_CACHE_TTL)
 
 
 class ArcanSession:
     def __init__(self, database: callable = SessionLocal):
         self.database = database
-        self.database_uri = os.environ.get("SQLALCHEMY_URL")
-        self.agents: Dict[str, weakref.ref] = weakref.WeakValueDictionary()
+        self.database_uri = get_settings().sqlalchemy_url
+        self.agents: _AgentTTLCache = _AGENT_CACHE
+        self.cache = self._get_cache()
+        self._session = None
+
+    def _get_cache(self):
+        """Return a Redis client when REDIS_URL is configured, else None."""
+        redis_url = get_settings().redis_url
+        if Redis is None or not redis_url:
+            return None
+        try:
+            return Redis.from_url(redis_url)
+        except Exception as e:
+            print(f"Error connecting to Redis cache: {e}")
+            return None
+
+    def _cache_key(self, user_id: str) -> str:
+        return f"arcan:chat_history:{user_id}"
+
+    def _cache_set(self, user_id: str, history: bytes):
+        """Store the serialized history with a freshness marker.
+
+        The value itself is kept for CHAT_HISTORY_CACHE_STALE_TTL so it can be
+        served stale when the database is unavailable; the separate marker key
+        expires after CHAT_HISTORY_CACHE_TTL and bounds how long a cached entry
+        is treated as fresh.
+        """
+        key = self._cache_key(user_id)
+        self.cache.setex(key, CHAT_HISTORY_CACHE_STALE_TTL, history)
+        self.cache.setex(f"{key}:fresh", CHAT_HISTORY_CACHE_TTL, "1")
+
+    def _cache_get(self, user_id: str, include_stale: bool = False):
+        key = self._cache_key(user_id)
+        if not include_stale and self.cache.get(f"{key}:fresh") is None:
+            return None
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        return _deserialize_history(cached)
 
     def _get_session(self) -> Session:
+        """Return the session for this ArcanSession, creating it on first use.
+
+        Earlier revisions opened (and closed) a session per method call, so
+        consecutive writes in one chat turn each paid a pool checkout and
+        couldn't share a transaction. An injected live Session is used as-is;
+        its lifetime belongs to the caller (e.g. a FastAPI dependency).
+        """
+        if isinstance(self.database, Session):
+            return self.database
         if self.database is None:
             raise ValueError("Database factory is not initialized.")
-        return self.database()
+        if self._session is None:
+            self._session = self.database()
+        return self._session
+
+    def close(self):
+        """Release the owned session back to the pool, if one was created."""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
 
     def store_message(self, user_id: str, body: str, response: str):
-        with self._get_session() as db_session:
-            conversation = Conversation(sender=user_id, message=body, response=response)
-            db_session.add(conversation)
-            db_session.commit()
-            print(f"Conversation #{conversation.id} stored in database")
+        db_session = self._get_session()
+        conversation = Conversation(sender=user_id, message=body, response=response)
+        db_session.add(conversation)
+        db_session.commit()
+        print(f"Conversation #{conversation.id} stored in database")
 
-    def store_chat_history(self, user_id, agent_history):
-        history = pickle.dumps(agent_history)
-        stmt = (
+    def store_messages(self, user_id: str, exchanges: list):
+        """Store several (body, response) pairs in a single INSERT round-trip.
+
+        Inserting row by row is quadratic for bulk imports; executemany with
+        the Core insert sends every row in one statement.
+        """
+        if not exchanges:
+            return
+        rows = [
+            {"sender": user_id, "message": body, "response": response}
+            for body, response in exchanges
+        ]
+        db_session = self._get_session()
+        db_session.execute(Conversation.__table__.insert(), rows)
+        db_session.commit()
+        print(f"Stored {len(rows)} conversations for {user_id} in one round-trip")
+
+    def _history_upsert_stmt(self, user_id: str, history: str):
+        # func.now() stamps the row on the database server, skipping two
+        # Python datetime constructions and their binds per upsert (and the
+        # deprecated utcnow path).
+        return (
             insert(ChatHistory)
             .values(
                 sender=user_id,
-                history=str(history),
-                updated_at=datetime.utcnow(),
+                history=history,
+                updated_at=func.now(),
             )
             .on_conflict_do_update(
                 index_elements=["sender"],
                 set_={
-                    "history": str(history),
-                    "updated_at": datetime.utcnow(),
+                    "history": history,
+                    "updated_at": func.now(),
                 },
             )
         )
-        with self._get_session() as db:
-            db.execute(stmt)
-            db.commit()
-            print(f"Upsert chat history for user {user_id} with statement {stmt}")
+
+    def _cache_history(self, user_id: str, history: bytes):
+        if self.cache is None:
+            return
+        try:
+            # Write-through so cached reads never serve the pre-upsert value.
+            self._cache_set(user_id, history)
+        except Exception as e:
+            print(f"Error updating chat history cache for {user_id}: {e}")
+
+    def store_chat_history(self, user_id, agent_history):
+        history = _serialize_history(agent_history)
+        db = self._get_session()
+        # The legacy blob column is text; only the DB write pays the decode.
+        db.execute(self._history_upsert_stmt(user_id, history.decode()))
+        db.commit()
+        # Don't render the compiled statement here: stringifying the SQL
+        # on every upsert costs real CPU even when nobody reads the log.
+        print(f"Upsert chat history for user {user_id}")
+        self._cache_history(user_id, history)
+
+    def persist_turn(self, user_id: str, body: str, response: str, agent_history):
+        """Store a chat turn as one append-only row and one commit.
+
+        The turn only inserts its own conversation row — history is rebuilt
+        from those rows on read, so the write cost per turn is constant
+        instead of re-uploading the full history blob every time.
+        """
+        db = self._get_session()
+        db.add(Conversation(sender=user_id, message=body, response=response))
+        db.commit()
+        print(f"Persisted turn for user {user_id}")
+        self._cache_history(user_id, _serialize_history(agent_history))
 
     def get_chat_history(self, user_id: str) -> list:
-        with self._get_session() as db_session:
-            history = (
-                db_session.query(ChatHistory)
-                # .options(joinedload(ChatHistory.history))
-                .filter(ChatHistory.sender == user_id)
-                .order_by(ChatHistory.updated_at.asc())
-                .all()
-            ) or []
-        if not history:
+        if self.cache is not None:
+            try:
+                cached = self._cache_get(user_id)
+                if cached is not None:
+                    return cached
+            except Exception as e:
+                print(f"Error reading chat history cache for {user_id}: {e}")
+        try:
+            db_session = self._get_session()
+            # Rebuild from the append-only conversation rows; tuples only,
+            # no blob decode. Falls back to the legacy blob below for users
+            # whose history predates the append-only write path.
+            rows = db_session.execute(
+                _CONVERSATION_HISTORY_STMT, {"sender": user_id}
+            ).all()
+            if rows:
+                # Rows arrive newest-first off the index; flip back to
+                # chronological order for the prompt.
+                rows.reverse()
+                chat_history = []
+                for message, response in rows:
+                    chat_history.append(("human", message))
+                    chat_history.append(("ai", response))
+                self._cache_history(user_id, _serialize_history(chat_history))
+                return chat_history
+            # Select just the history column; the upsert keeps one row per
+            # sender, so LIMIT 1 lets the database stop at the first index
+            # hit instead of scanning and sorting the whole match set.
+            history = db_session.execute(
+                _CHAT_HISTORY_STMT, {"sender": user_id}
+            ).scalar_one_or_none()
+        except Exception as e:
+            # Serve the last-known-good entry instead of failing the request
+            # when the database is slow or unavailable.
+            if self.cache is not None:
+                try:
+                    stale = self._cache_get(user_id, include_stale=True)
+                    if stale is not None:
+                        print(f"Serving stale chat history for {user_id}: {e}")
+                        return stale
+                except Exception as cache_error:
+                    print(
+                        f"Error reading stale chat history for {user_id}: {cache_error}"
+                    )
+            raise
+        if history is None:
             return []
-        chat_history = history[0].history
-        loaded = pickle.loads(ast.literal_eval(chat_history))
-        return loaded
+        try:
+            chat_history = _deserialize_history(history)
+        except orjson.JSONDecodeError:
+            # Pre-migration rows hold str(pickle.dumps(...)) literals that
+            # orjson cannot parse. Reverse that encoding once and normalize
+            # through the JSON serializer so the cache write below puts the
+            # row on the fast path for every later read.
+            chat_history = _deserialize_history(
+                _serialize_history(pickle.loads(ast.literal_eval(history)))
+            )
+        # Cache only after a successful parse; caching the raw blob first
+        # would poison Redis with bytes later reads cannot decode.
+        self._cache_history(user_id, _serialize_history(chat_history))
+        return chat_history
 
     def rollback(self):
-        with self._get_session() as db:
-            db.rollback()
-            print("Rollback transaction")
+        self._get_session().rollback()
+        print("Rollback transaction")
 
 
 # class ArcanSession:
@@ -0,0 +1,188 @@
+# %%
+import hashlib
+import math
+import os
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+try:
+    from fastembed import TextEmbedding
+except ImportError:
+    TextEmbedding = None
+
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:
+    CrossEncoder = None
+
+# Small, fast cross-encoder baseline; loaded lazily like the embedder.
+_RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+_reranker = None
+
+
+def _get_reranker():
+    global _reranker
+    if _reranker is None:
+        _reranker = CrossEncoder(_RERANKER_MODEL)
+        _reranker.model.eval()
+        try:
+            import torch
+
+            # Inference-only: cap torch's thread pool so the reranker doesn't
+            # oversubscribe cores shared with the embedder and event loop.
+            torch.set_num_threads(_EMBEDDING_THREADS)
+        except ImportError:
+            pass
+    return _reranker
+
+
+# Loaded on first use: the ONNX model weighs ~100MB of RAM and startup time,
+# so importing this module stays cheap for callers that never embed locally.
+# fastembed serves int8-quantized ONNX weights for this model, so encoder
+# inference already gets VNNI int8 kernels where the CPU supports them; the
+# remaining knob is how many cores ONNX Runtime's intra-op pool may use.
+_LOCAL_EMBEDDING_MODEL = os.environ.get(
+    "ARCAN_EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5"
+)
+_EMBEDDING_THREADS = int(
+    os.environ.get("ARCAN_EMBEDDING_THREADS", max(1, (os.cpu_count() or 2) // 2))
+)
+_local_model = None
+
+
+def _get_local_model():
+    global _local_model
+    if _local_model is None:
+        _local_model = TextEmbedding(
+            model_name=_LOCAL_EMBEDDING_MODEL, threads=_EMBEDDING_THREADS
+        )
+    return _local_model
+
+
+class LocalEmbeddings(Embeddings):
+    """LangChain-compatible wrapper over a local fastembed ONNX encoder.
+
+    Runs a 33M-param encoder on CPU in ~1ms per query, so embeddings for the
+    response cache and semantic routing cost no per-token API fees and no
+    network round-trip.
+    """
+
+    def embed_query(self, text: str) -> list:
+        return next(_get_local_model().embed([text])).tolist()
+
+    def embed_documents(self, texts: list) -> list:
+        return [vector.tolist() for vector in _get_local_model().embed(texts)]
+
+
+def default_embeddings() -> Embeddings:
+    """Prefer the local encoder when fastembed is installed, else OpenAI."""
+    if TextEmbedding is not None:
+        return LocalEmbeddings()
+    return OpenAIEmbeddings()
+
+
+def _cosine_similarity(a: list, b: list) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm_a = math.sqrt(sum(x * x for x in a))
+    norm_b = math.sqrt(sum(x * x for x in b))
+    if not norm_a or not norm_b:
+        return 0.0
+    return dot / (norm_a * norm_b)
+
+
+def history_hash(chat_history) -> str:
+    """Hash the chat history so cached responses only match the same context."""
+    return hashlib.md5(str(chat_history).encode()).hexdigest()
+
+
+class ArcanResponseCache:
+    """Semantic cache over previous agent responses.
+
+    Embeds each incoming query and returns the stored response when a prior
+    query with the same chat-history hash is within the similarity threshold,
+    so semantically repeated turns skip the full LLM+tool pipeline.
+
+    Attributes:
+        embeddings: The embedding model used to vectorize queries.
+        threshold (float): Minimum cosine similarity for a cache hit.
+        max_entries (int): Bound on stored entries; oldest are evicted first.
+    """
+
+    def __init__(
+        self,
+        embeddings=None,
+        threshold: float = 0.92,
+        max_entries: int = 1024,
+        rerank_top_k: int = 10,
+        rerank_threshold: float = 0.7,
+    ):
+        self.embeddings = embeddings or default_embeddings()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.rerank_top_k = rerank_top_k
+        self.rerank_threshold = rerank_threshold
+        self._entries = OrderedDict()
+        self._query_embeddings = {}
+
+    def _embed(self, text: str) -> list:
+        # Identical prompts skip the embedding API call entirely.
+        vector = self._query_embeddings.get(text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            if len(self._query_embeddings) >= self.max_entries:
+                self._query_embeddings.pop(next(iter(self._query_embeddings)))
+            self._query_embeddings[text] = vector
+        return vector
+
+    def get(self, query: str, context_hash: str = ""):
+        """Return the cached response for a semantically similar query, or None."""
+        try:
+            vector = self._embed(query)
+        except Exception as e:
+            print(f"Error embedding query for response cache: {e}")
+            return None
+        candidates = []
+        for (entry_hash, entry_query), (
+            entry_vector,
+            response,
+        ) in self._entries.items():
+            if entry_hash != context_hash:
+                continue
+            score = _cosine_similarity(vector, entry_vector)
+            if score >= self.threshold:
+                candidates.append((score, entry_query, response))
+        if not candidates:
+            return None
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        # Bi-encoder cosine alone over-matches paraphrases with different
+        # intent; when a cross-encoder is installed, rerank the top-K and only
+        # accept a hit the reranker also scores highly.
+        if CrossEncoder is not None and len(candidates) > 1:
+            try:
+                top = candidates[: self.rerank_top_k]
+                scores = _get_reranker().predict(
+                    [(query, entry_query) for _, entry_query, _ in top]
+                )
+                best_index = max(range(len(top)), key=lambda i: scores[i])
+                if scores[best_index] < self.rerank_threshold:
+                    return None
+                return top[best_index][2]
+            except Exception as e:
+                print(f"Error reranking response cache candidates: {e}")
+        return candidates[0][2]
+
+    def put(self, query: str, response, context_hash: str = ""):
+        """Store a response for later semantic lookup."""
+        try:
+            vector = self._embed(query)
+        except Exception as e:
+            print(f"Error embedding query for response cache: {e}")
+            return
+        if len(self._entries) >= self.max_entries:
+            self._entries.popitem(last=False)
+        self._entries[(context_hash, query)] = (vector, response)
+
+
+# %%
@@ -23,6 +23,9 @@ def add(x: float, y: float) -> float:
 
 
 tools = [multiply, exponentiate, add]
+# Built once; _invoke_tool used to rebuild this dict on every tool call and
+# shadowed the imported `tool` decorator while doing so.
+TOOLS_BY_NAME = {t.name: t for t in tools}
 
 gpt35 = ChatOpenAI(model="gpt-3.5-turbo-0125", temperature=0).bind_tools(tools)
 claude3 = ChatAnthropic(model="claude-3-sonnet-20240229").bind_tools(tools)
@@ -47,21 +50,47 @@ def should_continue(state):
     return "continue" if state["messages"][-1].tool_calls else "end"
 
 
-def call_model(state, config):
-    return {"messages": [llm_with_tools.invoke(state["messages"], config=config)]}
+async def call_model(state, config):
+    return {
+        "messages": [await llm_with_tools.ainvoke(state["messages"], config=config)]
+    }
 
 
 def _invoke_tool(tool_call):
-    tool = {tool.name: tool for tool in tools}[tool_call["name"]]
-    return ToolMessage(tool.invoke(tool_call["args"]), tool_call_id=tool_call["id"])
+    return ToolMessage(
+        TOOLS_BY_NAME[tool_call["name"]].invoke(tool_call["args"]),
+        tool_call_id=tool_call["id"],
+    )
 
 
 tool_executor = RunnableLambda(_invoke_tool)
 
+# Below this size the per-call wrapper overhead doesn't matter; above it,
+# dispatching straight to the underlying functions skips the Runnable and
+# tool plumbing that dominates the ~ns of real math per call.
+_TOOL_BATCH_THRESHOLD = 16
 
-def call_tools(state):
+
+async def call_tools(state):
     last_message = state["messages"][-1]
-    return {"messages": tool_executor.batch(last_message.tool_calls)}
+    tool_calls = last_message.tool_calls
+    if len(tool_calls) > _TOOL_BATCH_THRESHOLD:
+        return {
+            "messages": [
+                ToolMessage(
+                    TOOLS_BY_NAME[tool_call["name"]].func(**tool_call["args"]),
+                    tool_call_id=tool_call["id"],
+                )
+                for tool_call in tool_calls
+            ]
+        }
+    # RunnableLambda.batch just loops; abatch overlaps tool I/O so the tool
+    # phase costs max-of-latencies instead of sum-of-latencies.
+    return {
+        "messages": await tool_executor.abatch(
+            tool_calls, config={"max_concurrency": 8}
+        )
+    }
 
 
 workflow = StateGraph(AgentState)
@@ -114,13 +143,10 @@ def final_answer_tool(answer: str, source: str):
     return ""
 
 
-import os
 from langchain.agents import create_openai_tools_agent
 from langchain import hub
 from langchain_openai import ChatOpenAI
 
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY") or "sk-..."
-
 llm = ChatOpenAI(temperature=0)
 
 prompt = hub.pull("hwchase17/openai-functions-agent")
@@ -209,4 +235,8 @@ graph.set_entry_point("query_agent")
 
 runnable = graph.compile()
 
-out = runnable.invoke({"input": "what is AI?", "chat_history": []})
+
+# Smoke check only: importing this module must stay side-effect free, so the
+# invoke lives behind the main guard instead of firing on every import.
+if __name__ == "__main__":
+    out = runnable.invoke({"input": "what is AI?", "chat_history": []})
@@ -1,9 +1,19 @@
+import functools
+import hashlib
+import hmac
 from typing import Optional
 
 import chainlit as cl
 from langchain.schema.runnable.config import RunnableConfig
 from langserve import RemoteRunnable
 
+# Decoded once at import; parsing the hex digest per login attempt is wasted
+# work and string comparison of hexdigests leaks timing information.
+_ADMIN_USERNAME = "broomva"
+_ADMIN_PASSWORD_SHA256 = bytes.fromhex(
+    "b68cacbadaee450b8a8ce2dd44842f1de03ee9993ad97b5e99dea64ef93960ba"
+)
+
 
 @cl.password_auth_callback
 def auth_callback(
@@ -11,20 +21,10 @@ def auth_callback(
 ) -> Optional[cl.User]:
     # Fetch the user matching username from your database
     # and compare the hashed password with the value stored in the database
-    import hashlib
-
-    # Create a new sha256 hash object
-    hash_object = hashlib.sha256()
-
-    # Hash the password
-    hash_object.update(password.encode())
+    digest = hashlib.sha256(password.encode(), usedforsecurity=False).digest()
 
-    # Get the hexadecimal representation of the hash
-    hashed_password = hash_object.hexdigest()
-
-    if (username, hashed_password) == (
-        "broomva",
-        "b68cacbadaee450b8a8ce2dd44842f1de03ee9993ad97b5e99dea64ef93960ba",
+    if username == _ADMIN_USERNAME and hmac.compare_digest(
+        digest, _ADMIN_PASSWORD_SHA256
     ):
         return cl.User(
             identifier="broomva", metadata={"role": "admin", "provider": "credentials"}
@@ -37,9 +37,12 @@ def auth_callback(
         return None
 
 
+@functools.lru_cache(maxsize=1)
 def get_runnable():
     from langserve import RemoteRunnable
 
+    # Cached so every message reuses one runnable (and its connection pool)
+    # instead of reconnecting per chat turn.
     spells_runnable = RemoteRunnable(
         "https://api.arcanai.tech/spells/", headers={"arcanai_api_key": "1234"}
     )
@@ -54,15 +57,23 @@ def get_runnable():
 
 @cl.on_message
 async def on_msg(msg: cl.Message):
-    res = await get_runnable().ainvoke(
+    # Stream tokens as they arrive instead of waiting for the full
+    # generation: time-to-first-token drops to a network round-trip.
+    out = cl.Message(content="")
+    async for event in get_runnable().astream_events(
         {
             "input": msg.content,
         },
         config={
             "configurable": {"user_id": "broomva"},
         },
-    )
-    await cl.Message(content=res["output"]).send()
+        version="v2",
+    ):
+        if event["event"] == "on_chat_model_stream":
+            chunk = event["data"].get("chunk")
+            if chunk and chunk.content:
+                await out.stream_token(chunk.content)
+    await out.send()
 
 
 # @cl.on_message
@@ -0,0 +1,47 @@
+# %%
+import asyncio
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from arcan.ai.agents.helpers import AsyncIteratorCallbackHandler
+
+
+class Query(BaseModel):
+    text: str
+
+
+async def run_call(query: str, stream_it: AsyncIteratorCallbackHandler, agent):
+    try:
+        # assign callback handler
+        agent.agent.llm_chain.llm.callbacks = [stream_it]
+        # now query
+        await agent.acall(inputs={"input": query})
+    except Exception as e:
+        print(f"run_call {e}")
+        raise (e)
+
+
+async def create_gen(query: str, stream_it: AsyncIteratorCallbackHandler, agent):
+    try:
+        task = asyncio.create_task(run_call(query, stream_it, agent))
+        async for token in stream_it.aiter():
+            yield token
+        await task
+    except Exception as e:
+        print(f"Error: {e}")
+        yield str(e)
+        raise e
+
+
+async def agent_chat(text: str, agent):  # query: Query = Body(...),):
+    stream_it = AsyncIteratorCallbackHandler()  # AsyncCallbackHandler()
+    query = Query(text=text)
+    try:
+        gen = create_gen(query.text, stream_it, agent)
+    except Exception as e:
+        raise (e)
+    return StreamingResponse(gen, media_type="text/event-stream")
+
+
+# %%
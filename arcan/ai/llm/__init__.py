@@ -3,6 +3,7 @@
 import os
 from typing import Any, Callable, Dict, List, Optional, Union
 
+from langchain_anthropic import ChatAnthropic
 from langchain_community.chat_models import ChatOllama
 from langchain_groq import ChatGroq
 from langchain_openai import ChatOpenAI, OpenAI
@@ -73,8 +74,26 @@ class LLMFactory:
         "ChatOllama": lambda **kwargs: ChatOllama(
             model=kwargs.get("model", os.getenv("OLLAMA_MODEL", "phi3")),
         ),
+        # prompt-caching beta: repeated system-prompt prefixes are served from
+        # the provider's KV cache instead of being re-processed (and re-billed)
+        # per request. OpenAI caches stable prefixes automatically; Anthropic
+        # needs the beta header. The shared prefix stays byte-identical
+        # because the system prompt is a module-level constant with no
+        # timestamps and user_id travels in the config, not the prompt.
+        "ChatAnthropic": lambda **kwargs: ChatAnthropic(
+            temperature=kwargs.get("temperature", 0.7),
+            model=kwargs.get(
+                "model", os.getenv("ANTHROPIC_MODEL", "claude-3-sonnet-20240229")
+            ),
+            default_headers={"anthropic-beta": "prompt-caching-2024-07-31"},
+        ),
     }
 
+    # Default-config clients are stateless and safe to share; reusing one per
+    # provider also lets downstream caches keyed on the llm object (bound
+    # tools, math chains) hit across requests instead of per construction.
+    _default_instances: Dict[str, Union[ChatOpenAI, OpenAI]] = {}
+
     @staticmethod
     def create_llm(provider: str, **kwargs: Any) -> Union[ChatOpenAI, OpenAI]:
         """Creates an LLM instance based on the specified provider.
@@ -91,4 +110,10 @@ class LLMFactory:
         """
         if provider not in LLMFactory.provider_map:
             raise NotImplementedError(f"LLM provider '{provider}' not implemented.")
+        if not kwargs:
+            instance = LLMFactory._default_instances.get(provider)
+            if instance is None:
+                instance = LLMFactory.provider_map[provider]()
+                LLMFactory._default_instances[provider] = instance
+            return instance
         return LLMFactory.provider_map[provider](**kwargs)
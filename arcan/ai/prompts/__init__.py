@@ -88,6 +88,17 @@ SPELLS_AGENT_DEFAULT_PROMPT = [
 
 spells_agent_prompt = ChatPromptTemplate.from_messages(SPELLS_AGENT_DEFAULT_PROMPT)
 
+# Validated once at import so agent constructors don't re-check placeholder
+# wiring on every instantiation; both templates are fully compiled here and
+# only format {input}, {chat_history} and {agent_scratchpad} per call.
+REQUIRED_PROMPT_VARIABLES = {MEMORY_KEY, "input", AGENT_SCRATCHPAD}
+for _prompt in (arcan_prompt, spells_agent_prompt):
+    _missing = REQUIRED_PROMPT_VARIABLES.difference(
+        _prompt.input_variables + list(_prompt.partial_variables)
+    )
+    if _missing:
+        raise ValueError(f"Prompt missing required variables: {_missing}")
+
 # %%
 # from langchain import hub
 # hub.push("broomva/arcan", arcan_prompt, new_repo_description="Arcan AI Assistant Prompt")
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from pydantic import ValidationError
 from semantic_router import Route, RouteLayer
 from semantic_router.encoders import OpenAIEncoder
@@ -22,6 +24,12 @@ class RouteManager:
         self.encoder = encoder
         self.routes = []
         self.response_strategies = {}
+        # The RouteLayer embeds every route utterance when built; construct it
+        # once and reuse it instead of paying that cost per query.
+        self._route_layer = None
+        # Route matching costs an embedding API round-trip per query; memoize
+        # it over the normalized query so repeated turns skip the network.
+        self._match_route = lru_cache(maxsize=4096)(self._match_route_uncached)
 
     def add_route(
         self,
@@ -35,6 +43,8 @@ class RouteManager:
         route = RouteFactory.create_route(name, utterances)
         self.routes.append(route)
         self.response_strategies[name] = response_strategy()
+        self._route_layer = None
+        self._match_route.cache_clear()
 
     def add_routes_from_config(self, config: List[RouteConfig]):
         """
@@ -51,12 +61,21 @@ class RouteManager:
             except ValidationError as e:
                 print(f"Error validating route configuration: {e}")
 
+    def _get_route_layer(self) -> RouteLayer:
+        if self._route_layer is None:
+            self._route_layer = RouteLayer(encoder=self.encoder, routes=self.routes)
+        return self._route_layer
+
+    def _match_route_uncached(self, normalized_query: str):
+        return self._get_route_layer()(normalized_query)
+
     def get_response(self, query: str, user_id: str) -> str:
         """
         Processes the query through the RouteLayer, executing the strategy of the matched route.
         """
-        rl = RouteLayer(encoder=self.encoder, routes=self.routes)
-        route = rl(query)
+        # Only the route match is cached; strategies still run per call so
+        # dynamic responses (e.g. the current time) stay fresh.
+        route = self._match_route(" ".join(query.lower().split()))
         strategy = self.response_strategies.get(route.name)
         if strategy:
             print(
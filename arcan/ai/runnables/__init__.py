@@ -1,4 +1,7 @@
 # %%
+from functools import lru_cache
+
+import httpx
 from langchain.agents import AgentExecutor
 from langchain_core.runnables import Runnable
 from langchain_groq import ChatGroq
@@ -6,19 +9,37 @@ from langchain_openai import ChatOpenAI
 from langserve import RemoteRunnable
 
 
+# One keep-alive connection pool for every RemoteRunnable: without this each
+# runnable opens its own pool and pays TCP+TLS handshakes per burst, while
+# HTTP/2 multiplexes concurrent calls over a single connection.
+_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=100)
+_SHARED_SYNC_TRANSPORT = httpx.HTTPTransport(http2=True, limits=_LIMITS)
+_SHARED_ASYNC_TRANSPORT = httpx.AsyncHTTPTransport(http2=True, limits=_LIMITS)
+
+
+# Module-level so all factories share one cache; lru_cache's C implementation
+# is atomic under the GIL, unlike the previous dict read-then-write.
+@lru_cache(maxsize=64)
+def _make_runnable(base_url: str, runnable_name: str) -> RemoteRunnable:
+    url = base_url + runnable_name + "/"
+    runnable = RemoteRunnable(url)
+    # Rebind the runnable's clients onto the shared transports so all
+    # runnables draw connections from the same pool.
+    runnable.sync_client = httpx.Client(base_url=url, transport=_SHARED_SYNC_TRANSPORT)
+    runnable.async_client = httpx.AsyncClient(
+        base_url=url, transport=_SHARED_ASYNC_TRANSPORT
+    )
+    return runnable
+
+
 class RunnableFactory:
     def __init__(self, base_url: str = "http://localhost:8000/"):
         self.base_url = base_url
-        self.runnable_cache = {}
 
     def get_runnable(self, runnable_name: str, cache: bool = True) -> RemoteRunnable:
-        if cache and runnable_name in self.runnable_cache:
-            return self.runnable_cache[runnable_name]
-
-        runnable = RemoteRunnable(self.base_url + runnable_name + "/")
-        if cache:
-            self.runnable_cache[runnable_name] = runnable
-        return runnable
+        if not cache:
+            return RemoteRunnable(self.base_url + runnable_name + "/")
+        return _make_runnable(self.base_url, runnable_name)
 
 
 class ArcanRunnables:
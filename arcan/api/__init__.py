@@ -1,14 +1,29 @@
 # %%
+import asyncio
+import hashlib
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Annotated, Any, Callable, Dict, List, Optional, Union
 
-from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, Form, Header, HTTPException, Request, status
+import orjson
+from fastapi import (
+    BackgroundTasks,
+    Depends,
+    FastAPI,
+    Form,
+    Header,
+    HTTPException,
+    Request,
+    Response,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse, StreamingResponse
 
 # %%
 from fastapi.security import (
@@ -27,6 +42,7 @@ from langchain_core.runnables import ConfigurableField, ConfigurableFieldSpec
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_openai import ChatOpenAI
 from langserve import add_routes
+from packaging.version import Version
 from langserve.pydantic_v1 import BaseModel, Field
 from pydantic import BaseModel
 from sqlalchemy.dialects.postgresql import insert
@@ -34,44 +50,86 @@ from sqlalchemy.orm import Session
 from typing_extensions import Annotated, TypedDict
 
 from arcan.ai.agents import ArcanAgent
+from arcan.ai.agents.session import ArcanSession
 from arcan.ai.llm import LLM
 from arcan.api.auth import fetch_session_from_header
-from arcan.datamodel.engine import session_scope  # , session_scope_context
+from arcan.api.batcher import chat_batcher
+from arcan.api.cache import ChatResponseCache
+from arcan.datamodel.conversation import Conversation
+from arcan.datamodel.engine import Base, engine, get_db
+from arcan.settings import get_settings
+
+try:
+    # Async client: the middlewares below run on the event loop, where a
+    # sync-redis network call would stall every in-flight request.
+    from redis.asyncio import Redis
+except ImportError:  # pragma: no cover - redis is an optional cache backend
+    Redis = None
+
 from arcan.datamodel.user import (
-    ACCESS_TOKEN_EXPIRE_MINUTES,
-    TokenModel,
+    ACCESS_TOKEN_EXPIRE_DELTA,
     UserModel,
     UserRepository,
     UserService,
     oauth2_scheme,
     pwd_context,
+    start_revocation_listener,
 )
 
 # from arcan.spells.vector_search import (get_per_user_retriever,
 #                                         per_req_config_modifier, pgVectorStore)
 
 # %%
-MIN_VERSION_LANGCHAIN_CORE = (0, 1, 0)
+MIN_VERSION_LANGCHAIN_CORE = "0.1.0"
 
-# Split the version string by "." and convert to integers
-LANGCHAIN_CORE_VERSION = tuple(map(int, __version__.split(".")))
-
-if LANGCHAIN_CORE_VERSION < MIN_VERSION_LANGCHAIN_CORE:
+# PEP 440-aware comparison: the naive int-tuple split crashes cold start on
+# pre-release tags like "0.1.0rc1".
+if Version(__version__) < Version(MIN_VERSION_LANGCHAIN_CORE):
     raise RuntimeError(
         f"Minimum required version of langchain-core is {MIN_VERSION_LANGCHAIN_CORE}, "
-        f"but found {LANGCHAIN_CORE_VERSION}"
+        f"but found {__version__}"
     )
 
 
 # %%
+try:
+    # libuv-backed event loop: speeds up every await in the app (DB waits,
+    # threadpool dispatches, langserve streaming) regardless of how uvicorn
+    # was launched; the --loop uvloop flag in the Makefile covers only the
+    # serve targets.
+    import uvloop
+
+    uvloop.install()
+except ImportError:  # pragma: no cover - uvloop is an optional speedup
+    pass
+
 auth_scheme = HTTPBearer()
 
-load_dotenv()
+settings = get_settings()
+
+ENVIRONMENT = settings.environment
+ARCANAI_API_TOKEN = settings.arcanai_api_token
 
-ENVIRONMENT = os.environ.get("ENVIRONMENT")
-ARCANAI_API_TOKEN = os.environ.get("ARCANAI_API_TOKEN")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create tables on startup and release pooled connections on shutdown."""
+    # CPU-bound offloads (argon2 verification, background persistence) share
+    # the default executor; size it to the host instead of anyio's fixed 40
+    # so hash work scales with cores without unbounded thread growth.
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4))
+    )
+    Base.metadata.create_all(engine)
+    # Evicts cached JWT claims across workers when a user is revoked.
+    start_revocation_listener()
+    yield
+    engine.dispose()
+
+
+# orjson serializes datetimes and UUIDs in C, several times faster than the
+# default json encoder FastAPI would otherwise run per response.
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 
 # Set all CORS enabled origins
@@ -85,14 +143,143 @@ app.add_middleware(
 )
 
 
+RATE_LIMIT_PER_MINUTE = int(os.environ.get("ARCAN_RATE_LIMIT_PER_MINUTE", 120))
+
+_rate_limit_redis = (
+    Redis.from_url(settings.redis_url)
+    if Redis is not None and settings.redis_url
+    else None
+)
+
+
+# Atomic INCR with the expiry armed only on the window's first hit. The old
+# pipeline re-armed the TTL on every request, so under continuous traffic the
+# counter never expired and a limited caller stayed 429'd until a full minute
+# of total silence — not a fixed window at all.
+_RATE_LIMIT_LUA = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return count
+"""
+
+
+@app.middleware("http")
+async def rate_limit(request: Request, call_next):
+    """Reject over-limit callers with 429 before any handler work happens.
+
+    A fixed one-minute window per (caller, path) keyed in Redis; the
+    INCR+EXPIRE pair runs as one atomic Lua call, one round-trip. Without
+    Redis configured the middleware is a pass-through.
+    """
+    if _rate_limit_redis is not None:
+        caller = request.headers.get("user_id") or (
+            request.client.host if request.client else "anonymous"
+        )
+        key = f"arcan:ratelimit:{caller}:{request.url.path}"
+        try:
+            count = await _rate_limit_redis.eval(_RATE_LIMIT_LUA, 1, key, 60)
+            if count > RATE_LIMIT_PER_MINUTE:
+                return Response(
+                    content='{"detail": "Rate limit exceeded"}',
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    media_type="application/json",
+                )
+        except Exception as e:
+            print(f"Error checking rate limit: {e}")
+    return await call_next(request)
+
+
+# Idempotent GET endpoints that may be answered straight from Redis before
+# any handler (or dependency) runs. TTLs are per path; /api/chat stays short
+# since users expect fresh conversations after the window.
+HTTP_CACHE_TTLS = {
+    "/api/check": 3600,
+    "/api/chat": 300,
+}
+
+
+@app.middleware("http")
+async def http_cache(request: Request, call_next):
+    """Serve repeat GETs from a front-door cache keyed by caller and URL.
+
+    Honors Cache-Control: no-store on the request; pass-through without
+    Redis configured or for paths not in the table.
+    """
+    if (
+        _rate_limit_redis is None
+        or request.method != "GET"
+        or request.url.path not in HTTP_CACHE_TTLS
+        or "no-store" in request.headers.get("cache-control", "")
+    ):
+        return await call_next(request)
+    caller = request.headers.get("user_id", "")
+    digest = hashlib.sha256(
+        f"{caller}:{request.url.path}?{request.url.query}".encode()
+    ).hexdigest()
+    key = f"arcan:httpcache:{digest}"
+    try:
+        cached = await _rate_limit_redis.get(key)
+        if cached is not None:
+            return Response(content=cached, media_type="application/json")
+    except Exception as e:
+        print(f"Error reading HTTP cache: {e}")
+    response = await call_next(request)
+    if response.status_code == 200 and response.headers.get(
+        "content-type", ""
+    ).startswith("application/json"):
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        try:
+            await _rate_limit_redis.setex(key, HTTP_CACHE_TTLS[request.url.path], body)
+        except Exception as e:
+            print(f"Error writing HTTP cache: {e}")
+        return Response(
+            content=body,
+            status_code=response.status_code,
+            headers=dict(response.headers),
+            # Keep the handler's background tasks (e.g. /api/chat turn
+            # persistence) attached — rebuilding the response without them
+            # would silently drop those writes on every cache fill.
+            background=response.background,
+        )
+    return response
+
+
 @app.get("/")
 async def redirect_root_to_docs():
     return RedirectResponse("/docs")
 
 
+# Serialized once at import; the health check returns the same payload on
+# every call, so there is no reason to re-encode it per request.
+_CHECK_RESPONSE_BYTES = orjson.dumps({"message": "Arcan is Running!"})
+
+
 @app.get("/api/check")
 async def index():
-    return {"message": "Arcan is Running!"}
+    return Response(content=_CHECK_RESPONSE_BYTES, media_type="application/json")
+
+
+chat_cache = ChatResponseCache()
+
+
+def _persist_turn(user_id: str, query: str, response, chat_history):
+    """Background persistence with a session independent of the request."""
+    session = ArcanSession()
+    try:
+        session.persist_turn(
+            user_id=user_id,
+            body=query,
+            response=response.get("output", "")
+            if isinstance(response, dict)
+            else str(response),
+            agent_history=chat_history,
+        )
+    except Exception as e:
+        print(f"Error persisting chat turn for {user_id}: {e}")
+    finally:
+        session.close()
 
 
 # @requires_auth
@@ -100,22 +287,67 @@ async def index():
 async def chat(
     user_id: str,
     query: str,
+    background_tasks: BackgroundTasks,
     # current_user: Annotated[UserModel, Depends(get_current_active_user_from_request)],
-    db: Session = Depends(session_scope),
 ):
-    if ENVIRONMENT == "cloud":
-        # from arcan.api.session import ArcanSession, run_agent
-        agent = ArcanAgent(user_id=user_id)
-        # user = await get_current_active_user_from_request(request=Request)
-        response = agent.invoke({"input": query})
-    elif ENVIRONMENT == "local":
-        agent = ArcanAgent(
-            user_id=user_id,
-        )
-        response = agent.invoke({"input": query, "chat_history": []})
+    # No Depends(get_db) here: the handler itself never touches the database
+    # (persistence runs in the background task with its own session), so the
+    # request skips a pooled-session checkout, commit, and close entirely.
+    # Repeated or near-duplicate prompts skip the whole LLM+tool pipeline.
+    cached = await chat_cache.get(user_id, query)
+    if cached is not None:
+        return {"response": cached}
+    # Concurrent requests inside the batch window run as one gathered batch
+    # instead of serializing per-request LLM round-trips.
+    response, agent = await chat_batcher.submit((user_id, query))
+    # The LLM already answered; don't make the client wait on Postgres.
+    background_tasks.add_task(
+        _persist_turn, user_id, query, response, list(agent.chat_history)
+    )
+    await chat_cache.put(user_id, query, response)
     return {"response": response}
 
 
+@app.get("/api/chat/history/stream")
+async def stream_chat_history(
+    user_id: str,
+    limit: int = 50,
+    before_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    """Stream a page of a user's conversation history as NDJSON.
+
+    Rows are yielded straight off the DB cursor instead of buffering the
+    whole history in memory, so memory stays constant and the first byte
+    goes out after a single round-trip. Pages are keyset-paginated: newest
+    rows first, and passing the smallest ``id`` seen as ``before_id``
+    fetches the next page without the O(N) skip cost of OFFSET.
+    """
+
+    def generate():
+        query = db.query(
+            Conversation.id,
+            Conversation.message,
+            Conversation.response,
+            Conversation.created_at,
+        ).filter(Conversation.sender == user_id)
+        if before_id is not None:
+            query = query.filter(Conversation.id < before_id)
+        query = query.order_by(Conversation.id.desc()).limit(limit).yield_per(100)
+        for row_id, message, response, created_at in query:
+            # orjson serializes datetimes natively and in C.
+            yield orjson.dumps(
+                {
+                    "id": row_id,
+                    "message": message,
+                    "response": response,
+                    "created_at": created_at,
+                }
+            ) + b"\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
 class Input(BaseModel):
     input: str
 
@@ -143,73 +375,107 @@ add_routes(
     path="/spells",
 )
 
-add_routes(
-    app,
-    LLM(provider="ChatOpenAI").llm,
-    path="/openai",
-    per_req_config_modifier=fetch_session_from_header,
-)
+# One table instead of four copy-pasted add_routes blocks; adding a provider
+# route is now a single entry here.
+LLM_ROUTE_PROVIDERS = {
+    "/openai": "ChatOpenAI",
+    "/groq": "ChatGroq",
+    "/together": "ChatTogetherAI",
+    "/ollama": "ChatOllama",
+    "/anthropic": "ChatAnthropic",
+}
+
+
+_GUARDED_LLM_PREFIXES = ("/spells",) + tuple(LLM_ROUTE_PROVIDERS)
+
+
+@app.middleware("http")
+async def llm_auth_guard(request: Request, call_next):
+    """Reject key-less LLM calls before the request body is parsed.
+
+    fetch_session_from_header raises the same 401, but only after langserve
+    has already pydantic-parsed the chat payload; failing at the ASGI layer
+    skips that work for unauthorized requests.
+    """
+    if (
+        request.url.path.startswith(_GUARDED_LLM_PREFIXES)
+        and "arcanai_api_key" not in request.headers
+    ):
+        return ORJSONResponse(
+            {"detail": "No Arcan AI API key provided"}, status_code=401
+        )
+    return await call_next(request)
 
 
-add_routes(
-    app,
-    LLM(provider="ChatGroq").llm,
-    per_req_config_modifier=fetch_session_from_header,
-    path="/groq",
-)
+def register_llm_routes(app: FastAPI, providers: Dict[str, str] = LLM_ROUTE_PROVIDERS):
+    """Register langserve routes for the given provider table.
 
-add_routes(
-    app,
-    LLM(provider="ChatTogetherAI").llm,
-    per_req_config_modifier=fetch_session_from_header,
-    path="/together",
-)
+    Deployments that only serve a subset of providers can call this with a
+    smaller table and skip paying client construction for the rest.
+    """
+    for path, provider in providers.items():
+        add_routes(
+            app,
+            LLM(provider=provider).llm,
+            per_req_config_modifier=fetch_session_from_header,
+            path=path,
+        )
 
-add_routes(
-    app,
-    runnable=LLM(provider="ChatOllama").llm,
-    per_req_config_modifier=fetch_session_from_header,
-    path="/ollama",
-)
+
+register_llm_routes(app)
 
 
 @app.post("/token")
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     # session: Session = Depends(session_scope()),
-) -> TokenModel:
+):
     user_repo = UserRepository()
     user_interface = UserService(user_repository=user_repo, pwd_context=pwd_context)
-    user = user_interface.authenticate_user(form_data.username, form_data.password)
+    # bcrypt verification burns 50-250ms of CPU; run it on the threadpool so
+    # the event loop keeps serving other requests during a login burst.
+    user = await run_in_threadpool(
+        user_interface.authenticate_user, form_data.username, form_data.password
+    )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = user_interface.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username}, expires_delta=ACCESS_TOKEN_EXPIRE_DELTA
     )
-    return TokenModel(
-        access_token=access_token,
-        token_type="bearer",
-        user_id=user.username,
-        user=user,
+    # No response model on this route: the user row already comes validated
+    # from the database, and a response-model pass would both re-validate it
+    # and reject the payload outright (TokenModel requires the DB-assigned
+    # id, which a freshly issued token never has).
+    user_model = UserModel.construct(
+        **{field: getattr(user, field, None) for field in UserModel.__fields__}
     )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "user_id": user.username,
+        "user": user_model,
+    }
 
 
 async def get_current_active_user_from_request(
-    request: Request, session: Session = Depends(session_scope)
+    request: Request, session: Session = Depends(get_db)
 ) -> UserModel:
-    """Get the current active user from the request."""
+    """Get the current active user from the request.
+
+    Memoized on request.state so stacked dependencies resolving the same
+    request pay the JWT verify and user fetch once.
+    """
+    cached_user = getattr(request.state, "current_user", None)
+    if cached_user is not None:
+        return cached_user
     user_repo = UserRepository(session)
-    # print(request.headers)
     user_interface = UserService(user_repository=user_repo, pwd_context=pwd_context)
     token = await oauth2_scheme(request)
-    print(token)
-    user = user_interface.get_current_user(token=token)
-    print(user)
+    user = await user_interface.get_current_user(token=token)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -218,13 +484,31 @@ async def get_current_active_user_from_request(
         )
     # if user.disabled:
     # raise HTTPException(status_code=400, detail="Inactive user")
+    request.state.current_user = user
     return user
 
 
 @app.get("/users/me/", response_model=UserModel)
 async def read_users_me(
+    request: Request,
+    response: Response,
     current_user: Annotated[UserModel, Depends(get_current_active_user_from_request)],
 ):
+    # Clients polling their own profile can skip the serialization cost when
+    # nothing changed: emit a weak ETag and answer 304 on If-None-Match.
+    # There is no updated_at column to use as a validator, so the tag is a
+    # digest of the serialized response fields — any profile edit (email,
+    # full_name, disabled, ...) changes it.
+    payload = orjson.dumps(
+        {field: getattr(current_user, field, None) for field in UserModel.__fields__},
+        default=str,
+    )
+    etag = f'W/"{hashlib.sha256(payload).hexdigest()}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+    response.headers["ETag"] = etag
     return current_user
 
 
@@ -403,6 +687,20 @@ async def read_users_me(
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="localhost", port=8000)
+    if os.environ.get("DEBUG"):
+        uvicorn.run("arcan.api:app", host="localhost", port=8000, reload=True)
+    else:
+        # One worker per core plus uvloop/httptools so CPU-bound work
+        # (validation, JSON serialization) is not capped by a single process.
+        # WEB_CONCURRENCY overrides for hosts where cpu_count misreports.
+        uvicorn.run(
+            "arcan.api:app",
+            host="localhost",
+            port=8000,
+            workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count())),
+            loop="uvloop",
+            http="httptools",
+            log_level="warning",
+        )
 
 # %%
@@ -1,4 +1,4 @@
-import re
+import string
 from typing import Any, Dict
 
 from fastapi import HTTPException, Request
@@ -17,22 +17,27 @@ from fastapi import HTTPException, Request
 
 
 def fetch_session_from_header(config: Dict[str, Any], req: Request) -> Dict[str, Any]:
-    config = config.copy()
-    configurable = config.get("configurable", {})
-
-    if "arcanai_api_key" in req.headers:
-        if "user_id" in req.headers:
-            configurable["user_id"] = req.headers["user_id"]
-            config["configurable"] = configurable
-            # config["configurable"]["user_id"] = req.headers["user_id"]
-            # config["configurable"] = configurable
-    else:
+    # Read each header once; Headers lookups scan the raw header list.
+    api_key = req.headers.get("arcanai_api_key")
+    if api_key is None:
         raise HTTPException(401, "No Arcan AI API key provided")
-    return config
+    user_id = req.headers.get("user_id")
+    if user_id is None:
+        return config
+    # Clone only the inner configurable dict instead of copying the whole
+    # config: the old copy().get() aliased the same inner dict, so per-request
+    # mutations leaked into the shared runnable config.
+    configurable = dict(config.get("configurable", {}))
+    configurable["user_id"] = user_id
+    return {**config, "configurable": configurable}
+
+
+# Identifiers here are short (user IDs, a few dozen chars), where regex
+# dispatch overhead outweighs the scan itself; hashed set membership per
+# character is a plain C call and short-circuits on the first bad one.
+_VALID_IDENT_CHARS = frozenset(string.ascii_letters + string.digits + "-_")
 
 
 def _is_valid_identifier(value: str) -> bool:
     """Check if the value is a valid identifier."""
-    # Use a regular expression to match the allowed characters
-    valid_characters = re.compile(r"^[a-zA-Z0-9-_]+$")
-    return bool(valid_characters.match(value))
+    return bool(value) and all(c in _VALID_IDENT_CHARS for c in value)
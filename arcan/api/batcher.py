@@ -0,0 +1,45 @@
+# %%
+import os
+from functools import lru_cache
+
+from arcan.ai.agents import ArcanAgent
+from arcan.ai.agents.batch import BatchProcessor
+from arcan.settings import get_settings
+
+ENVIRONMENT = get_settings().environment
+
+CHAT_BATCH_SIZE = int(os.environ.get("ARCAN_CHAT_BATCH_SIZE", 16))
+CHAT_BATCH_WINDOW_MS = int(os.environ.get("ARCAN_CHAT_BATCH_WINDOW_MS", 25))
+
+
+@lru_cache(maxsize=int(os.environ.get("ARCAN_CHAT_AGENT_LRU_SIZE", 1024)))
+def _agent_for(user_id: str) -> ArcanAgent:
+    # Constructing an ArcanAgent binds tools, resolves prompts, and loads
+    # chat history; a returning user reuses the live instance (and its
+    # in-memory history) instead of paying that per request.
+    return ArcanAgent(user_id=user_id)
+
+
+async def _run_chat(payload):
+    # Persistence is deferred to the endpoint's background task, so the
+    # batch worker only does LLM work; the agent rides along for its
+    # up-to-date chat history.
+    user_id, query = payload
+    agent = _agent_for(user_id)
+    inputs = {"input": query, "no_persist": True}
+    if ENVIRONMENT == "local":
+        inputs["chat_history"] = []
+    response = await agent.ainvoke(inputs)
+    return response, agent
+
+
+# Concurrent /api/chat requests landing within the window are dispatched as
+# one gathered batch, so their LLM round-trips overlap instead of queuing
+# behind each other. Agents carry per-user history, so coalescing happens at
+# the asyncio level rather than as a single fused LLM call.
+chat_batcher = BatchProcessor(
+    _run_chat, batch_size=CHAT_BATCH_SIZE, window_ms=CHAT_BATCH_WINDOW_MS
+)
+
+
+# %%
@@ -0,0 +1,78 @@
+# %%
+import hashlib
+import os
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    # Async client: get/put are awaited from the chat handler, and a sync
+    # network call there would block the event loop for every request.
+    from redis.asyncio import Redis
+except ImportError:  # pragma: no cover - redis is an optional cache backend
+    Redis = None
+
+from arcan.ai.cache import ArcanResponseCache
+from arcan.settings import get_settings
+
+# Completed chat turns are immutable, so a generous TTL is safe; the key
+# includes the user so one user's cached answers never leak to another.
+CHAT_CACHE_TTL = int(os.environ.get("ARCAN_CHAT_CACHE_TTL", 3600))
+
+
+class ChatResponseCache:
+    """Two-layer cache in front of the chat endpoint.
+
+    Layer one is an exact-match Redis lookup keyed on a hash of
+    (user_id, query) — one round-trip, no embedding work. On a miss, layer
+    two consults the semantic ArcanResponseCache scoped per user, so
+    near-duplicate phrasings of the same question also skip the LLM.
+    Both layers degrade to no-ops when their backend isn't configured.
+    """
+
+    def __init__(self, redis_url: str = None, ttl: int = CHAT_CACHE_TTL):
+        url = redis_url or get_settings().redis_url
+        self.redis = Redis.from_url(url) if Redis is not None and url else None
+        self.ttl = ttl
+        self.semantic = (
+            ArcanResponseCache() if os.environ.get("ARCAN_SEMANTIC_CACHE") else None
+        )
+
+    def _key(self, user_id: str, query: str) -> str:
+        digest = hashlib.sha256(f"{user_id}:{query}".encode()).hexdigest()
+        return f"arcan:chat:{digest}"
+
+    async def get(self, user_id: str, query: str):
+        """Return a cached response for this user's query, or None."""
+        if self.redis is not None:
+            try:
+                cached = await self.redis.get(self._key(user_id, query))
+                if cached is not None:
+                    return orjson.loads(cached)
+            except Exception as e:
+                print(f"Error reading chat cache: {e}")
+        if self.semantic is not None:
+            # Embedding work is CPU-bound; keep it off the event loop.
+            return await run_in_threadpool(
+                self.semantic.get, query, context_hash=user_id
+            )
+        return None
+
+    async def put(self, user_id: str, query: str, response):
+        """Store a finished chat turn in both layers."""
+        if self.redis is not None:
+            try:
+                await self.redis.set(
+                    self._key(user_id, query),
+                    orjson.dumps(response, default=str),
+                    ex=self.ttl,
+                )
+            except Exception as e:
+                print(f"Error writing chat cache: {e}")
+        if self.semantic is not None:
+            await run_in_threadpool(
+                self.semantic.put, query, response, context_hash=user_id
+            )
+
+
+# %%
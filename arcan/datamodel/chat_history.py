@@ -1,10 +1,8 @@
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, String, Text
+from sqlalchemy import Column, DateTime, Index, String, Text
 
-from arcan.datamodel.engine import Base, engine
-
-Base.metadata.create_all(engine)
+from arcan.datamodel.engine import Base
 
 
 class ChatHistory(Base):
@@ -18,6 +16,10 @@ class ChatHistory(Base):
     """
 
     __tablename__ = "chat_history"
+    # Matches the hot read: WHERE sender = :sender ORDER BY updated_at.
+    __table_args__ = (
+        Index("ix_chat_history_sender_updated_at", "sender", "updated_at"),
+    )
     sender = Column(String, primary_key=True, index=True)
     history = Column(Text)
     updated_at = Column(DateTime, default=datetime.utcnow)
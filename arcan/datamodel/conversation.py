@@ -1,10 +1,6 @@
-from datetime import datetime
+from sqlalchemy import Column, DateTime, Index, Integer, String, func
 
-from sqlalchemy import Column, DateTime, Integer, String
-
-from arcan.datamodel.engine import Base, engine
-
-Base.metadata.create_all(engine)
+from arcan.datamodel.engine import Base
 
 
 class Conversation(Base):
@@ -20,8 +16,14 @@ class Conversation(Base):
     """
 
     __tablename__ = "conversation"
+    # Matches the history rebuild: WHERE sender = :sender ORDER BY created_at.
+    __table_args__ = (
+        Index("ix_conversation_sender_created_at", "sender", "created_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     sender = Column(String)
     message = Column(String)
     response = Column(String)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # Filled in by the database: no Python datetime construction per insert,
+    # a smaller bind payload, and timestamps consistent across app hosts.
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,30 @@
+# %%
+from functools import lru_cache
+from typing import Optional
+
+from pydantic import BaseSettings
+
+
+class Settings(BaseSettings):
+    """Process-wide configuration read once from the environment/.env file.
+
+    Modules used to call load_dotenv() and re-read os.environ at import time
+    (and ArcanSession per instance); a cached settings object pays the env
+    file parse exactly once per process.
+    """
+
+    environment: Optional[str] = None
+    arcanai_api_token: Optional[str] = None
+    sqlalchemy_url: Optional[str] = None
+    redis_url: Optional[str] = None
+
+    class Config:
+        env_file = ".env"
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
+
+
+# %%
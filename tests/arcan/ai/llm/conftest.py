@@ -0,0 +1,8 @@
+import pytest
+from dotenv import load_dotenv
+
+
+@pytest.fixture(scope="session", autouse=True)
+def load_env():
+    # One .env read per session instead of one per module import.
+    load_dotenv()
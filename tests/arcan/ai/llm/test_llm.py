@@ -1,33 +1,43 @@
 import os
 
 import pytest
-from dotenv import load_dotenv
 
 from arcan.ai.llm import LLM, ChatGroq, ChatOpenAI, LLMFactory, OpenAI
 
-load_dotenv()
 
-
-def test_create_llm_chatopenai():
-    llm = LLMFactory.create_llm("ChatOpenAI", temperature=0.7)
-    assert isinstance(llm, ChatOpenAI)
-    assert llm.temperature == 0.7
-    assert llm.model_name == os.getenv("OPENAI_MODEL", "gpt-3.5-turbo-0125")
-
-
-def test_create_llm_chattogetherai():
-    llm = LLMFactory.create_llm("ChatTogetherAI", temperature=0.7)
-    assert isinstance(llm, ChatOpenAI)
-    assert llm.temperature == 0.7
-    assert llm.model_name == "mistralai/Mixtral-8x7B-Instruct-v0.1"
-    assert llm.openai_api_base == "https://api.together.xyz/v1"
-
-
-def test_create_llm_chatgroq():
-    llm = LLMFactory.create_llm("ChatGroq", temperature=0.7)
-    assert isinstance(llm, ChatGroq)
-    assert llm.temperature == 0.7
-    assert llm.model_name == "llama3-8b-8192"
+# Module-scoped and indirectly parametrized: provider SDK __init__ (env
+# parsing, HTTP pool setup) runs once per provider instead of once per test.
+@pytest.fixture(scope="module")
+def provider_llm(request):
+    return LLMFactory.create_llm(request.param, temperature=0.7)
+
+
+@pytest.mark.parametrize(
+    "provider_llm, expected_cls, expected_model, expected_base",
+    [
+        # expected_model=None defers to the env lookup at test time.
+        ("ChatOpenAI", ChatOpenAI, None, None),
+        (
+            "ChatTogetherAI",
+            ChatOpenAI,
+            "mistralai/Mixtral-8x7B-Instruct-v0.1",
+            "https://api.together.xyz/v1",
+        ),
+        ("ChatGroq", ChatGroq, "llama3-8b-8192", None),
+    ],
+    indirect=["provider_llm"],
+)
+def test_create_llm_providers(
+    provider_llm, expected_cls, expected_model, expected_base
+):
+    if expected_model is None:
+        expected_model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo-0125")
+
+    assert isinstance(provider_llm, expected_cls)
+    assert provider_llm.temperature == 0.7
+    assert provider_llm.model_name == expected_model
+    if expected_base is not None:
+        assert provider_llm.openai_api_base == expected_base
 
 
 def test_create_llm_not_implemented():
@@ -1,58 +1,81 @@
+import asyncio
 import os
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
-from fastapi.testclient import TestClient
-from httpx import AsyncClient
-from sqlalchemy.orm import Session
 
-from arcan.api import app  # Adjust this import based on your project structure
-from arcan.datamodel.engine import session_scope
+from arcan.datamodel.user import User
 
-
-@pytest.mark.asyncio
-async def test_redirect_root_to_docs():
-    async with AsyncClient(app=app, base_url="http://test") as ac:
-        response = await ac.get("/")
-        assert response.status_code == 307  # Redirect status code
-        assert response.headers["location"] == "/docs"
-
-
-@pytest.mark.asyncio
-async def test_index():
-    async with AsyncClient(app=app, base_url="http://test") as ac:
-        response = await ac.get("/api/check")
-        assert response.status_code == 200
-        assert response.json() == {"message": "Arcan is Running!"}
+# Keep tests sharing the session-scoped AsyncClient on one xdist worker.
+pytestmark = pytest.mark.xdist_group("asgi")
 
 
-from unittest.mock import MagicMock, patch
+@pytest.fixture(scope="module")
+def auth_headers():
+    # Built once per module: MagicMock construction and header formatting
+    # are pure per-test overhead. Note the header name has no trailing
+    # space — the old typo ("Authorization ") meant the server never saw
+    # the credential at all.
+    return {"Authorization": f"Bearer {os.getenv('ARCANAI_API_KEY', '')}"}
 
 
 @pytest.mark.asyncio
+@patch("arcan.api.chat_batcher.submit", new_callable=AsyncMock)
 @patch("arcan.datamodel.engine")  # Correct the import path as necessary
-async def test_chat(mock_session_scope):
+async def test_api_smoke(mock_session_scope, mock_submit, aclient, auth_headers):
     # Create a mock session
     mock_session = MagicMock()
     mock_session_scope.return_value = mock_session
 
-    # Mock specific behaviors, e.g., query handling
-    # mock_session.query.return_value.filter.return_value.one.return_value = YourUserModel(id="1", name="Test User")
+    # Stub the batcher so the chat assertion is deterministic: without it
+    # the handler would invoke the real agent pipeline (and fail without
+    # credentials). The batcher returns (response, agent).
+    mock_submit.return_value = ("test", MagicMock(chat_history=[]))
+
+    # One concurrent pass over the read-only endpoints: the three requests
+    # overlap inside the ASGI app instead of running as serial round-trips.
+    docs, check, chat = await asyncio.gather(
+        aclient.get("/"),
+        aclient.get("/api/check"),
+        aclient.get(
+            "/api/chat",
+            params={"user_id": "test_user", "query": "testinggggg$#@"},
+            headers=auth_headers,
+        ),
+    )
 
-    # # Set up a test response for `run_agent` if needed
-    # with patch('your_module_path.run_agent') as mock_run_agent:
-    #     mock_run_agent.return_value = "Test Response"
+    assert docs.status_code == 307  # Redirect status code
+    assert docs.headers["location"] == "/docs"
 
-    mock_token = MagicMock()
-    mock_token.credentials = os.getenv("ARCANAI_API_KEY")
+    assert check.status_code == 200
+    assert check.json() == {"message": "Arcan is Running!"}
 
-    async with AsyncClient(app=app, base_url="http://test") as ac:
-        response = await ac.get(
-            "/api/chat",
-            params={"user_id": "test_user", "query": "testinggggg$#@"},
-            headers={"Authorization ": f"Bearer {mock_token.credentials}"},
-        )
-        assert response.status_code == 200
-        assert response.json() == {"response": "test"}
+    assert chat.status_code == 200
+    assert chat.json() == {"response": "test"}
+
+
+@pytest.mark.asyncio
+@patch("arcan.api.UserService")
+async def test_login_returns_token(mock_service_cls, aclient):
+    service = mock_service_cls.return_value
+    service.authenticate_user.return_value = User(
+        username="ada",
+        email="ada@example.com",
+        full_name="Ada Lovelace",
+        status="active",
+        disabled=False,
+        hashed_password="not-a-real-hash",
+    )
+    service.create_access_token.return_value = "token123"
+
+    response = await aclient.post("/token", data={"username": "ada", "password": "pw"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["access_token"] == "token123"
+    assert body["token_type"] == "bearer"
+    assert body["user_id"] == "ada"
+    assert body["user"]["username"] == "ada"
 
 
 # def test_llm_endpoints():
@@ -64,24 +87,3 @@ async def test_chat(mock_session_scope):
 
 #     response = client.get("/together")
 #     assert response.status_code == 200
-
-
-# # Initialize the test client
-# client = TestClient(app)
-
-# def test_redirect_root_to_docs():
-#     response = client.get("/")
-#     assert response.status_code == 307
-#     assert response.headers["location"] == "/docs"
-
-# def test_check_api():
-#     response = client.get("/api/check")
-#     assert response.status_code == 200
-#     assert response.json() == {"message": "Arcan is Running!"}
-
-# def test_chat_api():
-#     user_id = "test_user"
-#     query = "Hello, Arcan!"
-#     response = client.get(f"/api/chat?user_id={user_id}&query={query}")
-#     assert response.status_code == 200
-#     assert "response" in response.json()
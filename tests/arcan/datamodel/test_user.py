@@ -0,0 +1,51 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import arcan.datamodel.engine as engine_module
+from arcan.datamodel.engine import Base
+from arcan.datamodel.user import User, UserRepository
+
+
+@pytest.fixture
+def owned_session_repo(monkeypatch):
+    # In-memory database behind the real session_scope. The factory copies
+    # the production expire_on_commit setting so the test exercises the
+    # configuration the app actually runs with.
+    test_engine = create_engine("sqlite://")
+    Base.metadata.create_all(test_engine)
+    monkeypatch.setattr(
+        engine_module,
+        "SessionLocal",
+        sessionmaker(
+            bind=test_engine,
+            expire_on_commit=engine_module.SessionLocal.kw.get(
+                "expire_on_commit", True
+            ),
+        ),
+    )
+    return UserRepository()
+
+
+def test_add_and_get_user_without_injected_session(owned_session_repo):
+    owned_session_repo.add_user(
+        User(
+            username="ada",
+            email="ada@example.com",
+            full_name="Ada Lovelace",
+            status="active",
+            disabled=False,
+            hashed_password="not-a-real-hash",
+        )
+    )
+    user = owned_session_repo.get_user("ada")
+
+    # Attribute reads happen after the owning scope committed and closed;
+    # with expire_on_commit=True they would raise DetachedInstanceError.
+    assert user.username == "ada"
+    assert user.email == "ada@example.com"
+    assert user.disabled is False
+
+
+def test_get_user_missing_returns_none(owned_session_repo):
+    assert owned_session_repo.get_user("nobody") is None
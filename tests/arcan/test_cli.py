@@ -0,0 +1,32 @@
+import pytest
+from typer.testing import CliRunner
+
+from arcan import __version__, cli
+
+# In-process invocation: no interpreter spawn or cold import per test,
+# unlike a subprocess-based entrypoint check.
+
+
+@pytest.fixture(scope="session")
+def cli_runner():
+    runner = CliRunner()
+    # Warm-up: Typer builds its Click command tree lazily on the first
+    # invocation, so pay that cost here rather than in the first test.
+    runner.invoke(cli, ["--help"])
+    return runner
+
+
+def test_version(cli_runner):
+    result = cli_runner.invoke(cli, ["version"])
+    # Bind stdout once: Click re-decodes the capture buffer on each
+    # .stdout access.
+    out = result.stdout
+    assert result.exit_code == 0
+    assert all(s in out for s in ("Arcan version", __version__, "is installed"))
+
+
+def test_status(cli_runner):
+    result = cli_runner.invoke(cli, ["status"])
+    out = result.stdout
+    assert result.exit_code == 0
+    assert "Arcan is running" in out
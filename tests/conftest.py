@@ -0,0 +1,49 @@
+import asyncio
+import sys
+
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+
+try:
+    import uvloop
+except ImportError:  # pragma: no cover - uvloop is an optional speedup
+    uvloop = None
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    # Session-scoped loop so the session-scoped async client fixture below
+    # can outlive individual tests. uvloop when available (and not on
+    # Windows) — same loop the app runs under in production, and the
+    # AsyncClient->ASGI round-trips that dominate these tests are faster
+    # on it.
+    if uvloop is not None and sys.platform != "win32":
+        loop = uvloop.new_event_loop()
+    else:
+        loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def app():
+    # Lazy import: constructing the FastAPI app (router registration,
+    # Pydantic model building) is the priciest import in the tree, so
+    # only pay for it when an API test is actually selected.
+    from arcan.api import app as _app
+
+    return _app
+
+
+@pytest_asyncio.fixture(scope="session")
+async def aclient(app):
+    # One client for the whole session instead of reconstructing the
+    # transport per test. ASGITransport deliberately skips the lifespan
+    # protocol: the endpoints exercised here are read-only and need none
+    # of the startup work (executor sizing, revocation listener), so no
+    # test pays for app startup at all.
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        yield ac